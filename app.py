@@ -8,15 +8,24 @@ import os
 from requests.utils import quote
 import requests
 
-from config import CSV_PATH, REPO, GITHUB_TOKEN
+from config import CSV_PATH, REPO, GITHUB_TOKEN, HISTORICO_PATH, TTL
 from utils.github import salvar_csv_em_github, alterar_csv_em_github, carregar_csv_do_github, salvar_imagem_em_github
-from utils.helpers import adicionar_preco_medio, autenticar, formatar_nome_arquivo, gerar_grafico_barra
+from utils.historico import listar_coletas, montar_historico, valor_total_por_data, maiores_variacoes
+from utils.helpers import autenticar, formatar_nome_arquivo, gerar_grafico_barra
+
+@st.cache_resource(ttl=TTL)
+def carregar_historico(arquivos):
+    return montar_historico(pd.read_csv(arquivo) for arquivo in arquivos)
 
 if "aba_atual" not in st.session_state:
     st.session_state["aba_atual"] = "Books"
 
 st.set_page_config(page_title="Book Collection", layout="wide")
 
+if not GITHUB_TOKEN:
+    st.error("GitHub token not found. Set github_token in the Streamlit secrets or the GITHUB_TOKEN environment variable.")
+    st.stop()
+
 aba_atual = st.sidebar.radio("Pages", ["Books", "Dashboard", "Add Book", "Book Manager"])
 st.session_state["aba_atual"] = aba_atual
 
@@ -42,27 +51,18 @@ with col1:
     """)
 
 with col2:
-    reprocessar = st.button("Refresh Data", help="Reprocess the data from the CSV file and update the collection.")
+    reprocessar = st.button("Refresh Data", help="Reload the collection and the prices computed by the scheduled refresh.")
 
     if reprocessar:
-        st.session_state.pop("df", None)
-        df = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN)
-
-        # Remove duplicatas antes de qualquer processamento
-        df = df.drop_duplicates(keep="last")
-
-        # Mantém apenas as colunas relevantes
-        df = df.loc[:, ["isbn", "genre", "cover", "title", "authors", "publisher", "year", "preco_medio", "collection", "volume", "pages", "type","preco_correto"]]
-
-        df_com_precos = adicionar_preco_medio(df)
-        # Salva no GitHub e atualiza o estado
-        alterar_csv_em_github(df_com_precos, REPO, CSV_PATH, GITHUB_TOKEN)
-        st.session_state["df"] = df_com_precos.drop_duplicates(keep="last")
+        # Os preços são calculados fora do app por 'python cli.py refresh'; aqui só relemos o resultado
+        st.session_state["df"], st.session_state["sha"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN, retornar_sha=True)
+        st.session_state["df"] = st.session_state["df"].drop_duplicates(keep="last")
         st.success("Data updated!")
 
     else:
         if "df" not in st.session_state:
-            st.session_state["df"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN)
+            # Guarda o sha junto: o Book Manager só grava se o arquivo não mudou desde esta leitura
+            st.session_state["df"], st.session_state["sha"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN, retornar_sha=True)
 
 with col3:
     # Executa autenticação uma vez
@@ -265,11 +265,57 @@ elif st.session_state["aba_atual"] == "Dashboard":
         st.plotly_chart(fig3, use_container_width=True)
         st.plotly_chart(fig4, use_container_width=True)
 
+    # Histórico de preços
+    st.markdown("---")
+    st.subheader("Price history")
+    # As coletas ficam em historico/ no próprio repositório; o índice em memória é refeito quando chega arquivo novo
+    arquivos_historico = tuple(listar_coletas(HISTORICO_PATH))
+
+    if not arquivos_historico:
+        st.info("No price history yet. It is recorded on every scheduled price refresh.")
+    else:
+        historico = carregar_historico(arquivos_historico)
+        evolucao = valor_total_por_data(historico, tipo=tipo)
+        fig5 = go.Figure(go.Scatter(
+            x=evolucao["data"],
+            y=evolucao["valor_total"],
+            mode="lines+markers",
+            line=dict(color="#D3D3D3")
+        ))
+        fig5.update_layout(
+            title_text="Total value over time",
+            title_x=0.0,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            font=dict(color='white'),
+            yaxis=dict(title="R$"),
+            showlegend=False
+        )
+
+        variacoes = maiores_variacoes(historico, n=10, tipo=tipo)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.plotly_chart(fig5, use_container_width=True)
+        with col2:
+            st.markdown("**Biggest movers since each book's first recorded price**")
+            st.dataframe(
+                variacoes.drop(columns=["type"]).rename(columns={
+                    "title": "Title",
+                    "preco_anterior": "First price",
+                    "preco_atual": "Current price",
+                    "variacao": "Change (R$)",
+                    "variacao_pct": "Change (%)"
+                }),
+                hide_index=True,
+                use_container_width=True
+            )
+
 elif st.session_state["aba_atual"] == "Add Book":
     st.header("Add book to collection")
     
     st.session_state.pop("df", None)
-    st.session_state["df"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN)
+    st.session_state["df"], st.session_state["sha"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN, retornar_sha=True)
 
     df_existente = st.session_state["df"]
 
@@ -356,15 +402,11 @@ elif st.session_state["aba_atual"] == "Add Book":
             "pages": pages_form,
             "type": type_form,
             "preco_correto": preco_form,
+            # Sem preço até a próxima atualização agendada
+            "preco_medio": 0.0,
             "cover": f"https://raw.githubusercontent.com/a-ruivo/books_catalog/main/{caminho_imagem_repo}"
         }])
 
-        try:
-            nova_carta = adicionar_preco_medio(nova_carta)
-        except Exception as e:
-            st.error(f"Erro ao calcular preço médio: {e}")
-            st.stop()
-
         ja_existe = (
             (df_existente["title"].apply(formatar_nome_arquivo) == formatar_nome_arquivo(title_form)) &
             (df_existente["type"] == type_form)
@@ -386,7 +428,7 @@ elif st.session_state["aba_atual"] == "Add Book":
 
             sucesso_csv, msg_csv = salvar_csv_em_github(df_form, REPO, CSV_PATH, GITHUB_TOKEN)
             if sucesso_csv:
-                st.session_state["df"] = df_form
+                st.session_state["df"], st.session_state["sha"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN, retornar_sha=True)
                 st.success("Book added!")
             else:
                 st.error(f"Error saving in GitHub: {msg_csv}")
@@ -399,8 +441,8 @@ elif st.session_state["aba_atual"] == "Book Manager":
         st.warning("Enter the password to access this page.")
         st.stop()
 
-    if "df" not in st.session_state:
-        st.session_state["df"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN)
+    if "df" not in st.session_state or "sha" not in st.session_state:
+        st.session_state["df"], st.session_state["sha"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN, retornar_sha=True)
 
     df_manager = st.session_state["df"]
 
@@ -412,9 +454,14 @@ elif st.session_state["aba_atual"] == "Book Manager":
     )
 
     if st.button("Save"):
-        sucesso, mensagem = alterar_csv_em_github(df_editado, REPO, CSV_PATH, GITHUB_TOKEN)
+        # Grava com o sha da leitura: se o arquivo mudou (ex.: atualização agendada de preços), o GitHub recusa
+        sucesso, mensagem = alterar_csv_em_github(df_editado, REPO, CSV_PATH, GITHUB_TOKEN, sha=st.session_state["sha"])
         if sucesso:
-            st.session_state["df"] = df_editado
+            st.session_state["df"], st.session_state["sha"] = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN, retornar_sha=True)
             st.success("Changes saved!")
         else:
-            st.error(f"Error saving in GitHub: {mensagem}")
+            _, sha_atual = carregar_csv_do_github(REPO, CSV_PATH, GITHUB_TOKEN, retornar_sha=True)
+            if sha_atual != st.session_state["sha"]:
+                st.error("The collection was changed after this page was loaded (for example by the scheduled price refresh), so your changes were not saved. Click 'Refresh Data' and make them again.")
+            else:
+                st.error(f"Error saving in GitHub: {mensagem}")
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+import tomllib
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from config import CSV_PATH, REPO, GITHUB_TOKEN, HISTORICO_PATH, ESTATISTICA_PRECO, ESTATISTICAS_PRECO
+from utils.github import carregar_csv_do_github, alterar_csv_em_github, salvar_arquivo_em_github
+from utils.helpers import adicionar_preco_medio
+from utils.historico import gerar_coleta, caminho_coleta
+
+COLUNAS = ["isbn", "genre", "cover", "title", "authors", "publisher", "year", "preco_medio", "collection", "volume", "pages", "type", "preco_correto"]
+
+
+def primeiro_definido(*valores):
+    # Um valor explícito (mesmo 0 ou vazio) vale; só None conta como ausente
+    return next((valor for valor in valores if valor is not None), None)
+
+
+def carregar_configuracao(parser, args):
+    # Ordem de prioridade: argumentos da linha de comando, arquivo --config (mesmas chaves do
+    # secrets.toml), variáveis de ambiente e, por fim, os padrões de config.py
+    arquivo = {}
+    if args.config:
+        with open(args.config, "rb") as f:
+            arquivo = tomllib.load(f)
+    linha_de_comando = {"workers": args.workers, "estatistica_preco": args.estatistica}
+
+    padroes = {
+        "github_token": GITHUB_TOKEN,
+        "repo": REPO,
+        "csv_path": CSV_PATH,
+        "historico_path": HISTORICO_PATH,
+        "estatistica_preco": ESTATISTICA_PRECO,
+        "workers": 4,
+    }
+    configuracao = {
+        chave: primeiro_definido(linha_de_comando.get(chave), arquivo.get(chave), os.environ.get(chave.upper()), padrao)
+        for chave, padrao in padroes.items()
+    }
+
+    # Erros de configuração encerram o comando com uma mensagem curta, sem traceback
+    if not configuracao["github_token"]:
+        parser.error("GitHub token not found. Set GITHUB_TOKEN or github_token in the --config file.")
+    if configuracao["estatistica_preco"] not in ESTATISTICAS_PRECO:
+        parser.error(f"Invalid estatistica_preco '{configuracao['estatistica_preco']}'. Use one of: {', '.join(ESTATISTICAS_PRECO)}.")
+    try:
+        configuracao["workers"] = int(configuracao["workers"])
+    except ValueError:
+        parser.error(f"Invalid workers '{configuracao['workers']}'. Use a whole number.")
+    if configuracao["workers"] < 1:
+        parser.error("workers must be at least 1.")
+    return configuracao
+
+
+def mesclar_precos(df_atual, df_com_precos, nova_coluna="preco_medio"):
+    # Leva só os preços raspados para a versão atual do CSV, casando por título e tipo.
+    # Livros incluídos, editados ou marcados com preco_correto = 'yes' durante a busca são preservados.
+    chave = ["title", "type"]
+    precos = df_com_precos.drop_duplicates(subset=chave, keep="last").set_index(chave)[nova_coluna]
+    novos = precos.reindex(pd.MultiIndex.from_frame(df_atual[chave].astype(str))).to_numpy()
+    atualizar = (df_atual["preco_correto"] != "yes").to_numpy() & pd.notna(novos)
+
+    df = df_atual.copy()
+    df.loc[atualizar, nova_coluna] = novos[atualizar]
+    return df
+
+
+def atualizar_precos(repo, csv_path, historico_path, token, estatistica=ESTATISTICA_PRECO, workers=4, tentativas=3):
+    df = carregar_csv_do_github(repo, csv_path, token)
+
+    # Remove duplicatas antes de qualquer processamento
+    df = df.drop_duplicates(keep="last")
+
+    # Mantém apenas as colunas relevantes
+    df = df.loc[:, COLUNAS]
+
+    df_com_precos = adicionar_preco_medio(df, estatistica=estatistica, workers=workers)
+    df_com_precos[["title", "type"]] = df_com_precos[["title", "type"]].astype(str)
+
+    # A busca leva minutos: relê o CSV e grava com o sha lido, repetindo se alguém alterou o arquivo nesse meio tempo
+    for tentativa in range(tentativas):
+        df_atual, sha = carregar_csv_do_github(repo, csv_path, token, retornar_sha=True)
+        df_atual = df_atual.drop_duplicates(keep="last").loc[:, COLUNAS]
+        sucesso, mensagem = alterar_csv_em_github(mesclar_precos(df_atual, df_com_precos), repo, csv_path, token, sha=sha)
+        if sucesso:
+            break
+        print(f"Erro ao salvar CSV (tentativa {tentativa + 1} de {tentativas}): {mensagem}")
+    else:
+        return False, mensagem
+
+    # O histórico só recebe a coleta depois que os preços chegaram ao CSV; cada coleta é um arquivo novo
+    data = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    conteudo = gerar_coleta(df_com_precos, data).to_csv(index=False).encode()
+    return salvar_arquivo_em_github(conteudo, repo, caminho_coleta(historico_path, data), token, mensagem_commit="Atualização do histórico de preços")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Book catalog maintenance tasks.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_refresh = subparsers.add_parser("refresh", help="Scrape Estante Virtual prices and save them to GitHub.")
+    parser_refresh.add_argument("--config", help="TOML file with github_token, repo, csv_path, historico_path, estatistica_preco and workers.")
+    parser_refresh.add_argument("--workers", type=int, help="Number of books scraped at the same time.")
+    parser_refresh.add_argument("--estatistica", choices=ESTATISTICAS_PRECO, help="Statistic saved as preco_medio.")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == "refresh":
+        configuracao = carregar_configuracao(parser, args)
+
+        sucesso, mensagem = atualizar_precos(
+            configuracao["repo"],
+            configuracao["csv_path"],
+            configuracao["historico_path"],
+            configuracao["github_token"],
+            estatistica=configuracao["estatistica_preco"],
+            workers=configuracao["workers"],
+        )
+        print(mensagem)
+        return 0 if sucesso else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,26 @@
-import streamlit as st
+import os
 
-CSV_PATH = "livros.csv"
-REPO = "a-ruivo/books_catalog"
-GITHUB_TOKEN = st.secrets["github_token"]
-TTL = 86400  # 24 horas
\ No newline at end of file
+
+def ler_configuracao(nome, padrao=None):
+    # Variáveis de ambiente (ex.: GITHUB_TOKEN) têm prioridade; no Streamlit cai para st.secrets
+    valor = os.environ.get(nome.upper())
+    if valor:
+        return valor
+    try:
+        import streamlit as st
+        return st.secrets[nome]
+    except (ImportError, KeyError, FileNotFoundError):
+        # Sem Streamlit instalado, sem secrets.toml ou sem a chave
+        return padrao
+
+
+CSV_PATH = ler_configuracao("csv_path", "livros.csv")
+REPO = ler_configuracao("repo", "a-ruivo/books_catalog")
+GITHUB_TOKEN = ler_configuracao("github_token")
+TTL = 86400  # 24 horas
+
+HISTORICO_PATH = ler_configuracao("historico_path", "historico")
+
+# Estatística usada como preco_medio: "mediana", "media_aparada" ou "media"
+ESTATISTICAS_PRECO = ["mediana", "media_aparada", "media"]
+ESTATISTICA_PRECO = ler_configuracao("estatistica_preco", "mediana")
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+import cli
+from utils import helpers
+from utils.helpers import adicionar_preco_medio, calcular_estatisticas_precos, extrair_precos
+from utils.historico import gerar_coleta, maiores_variacoes, montar_historico, valor_total_por_data
+
+
+def test_extrair_precos_ignora_parcelas_e_frete():
+    html = (
+        "<span>R$ 1.234,56</span>"
+        "<span>3x de R$ 10,00</span>"
+        "<span>Frete R$ 12,00</span>"
+        "<span>R$ 25,90</span>"
+    )
+    np.testing.assert_array_equal(extrair_precos(html), [1234.56, 25.90])
+
+
+def test_estatisticas_linha_sem_anuncios_e_busca_com_erro():
+    estatisticas = calcular_estatisticas_precos([np.array([]), None])
+
+    assert estatisticas["n_anuncios"].iloc[0] == 0
+    assert not estatisticas["falha_busca"].iloc[0]
+    assert np.isnan(estatisticas["n_anuncios"].iloc[1])
+    assert estatisticas["falha_busca"].iloc[1]
+    assert estatisticas[["media", "mediana", "media_aparada", "preco_min", "preco_max"]].isna().all().all()
+
+
+def test_estatisticas_rejeita_outliers_pelo_iqr():
+    estatisticas = calcular_estatisticas_precos([np.array([10.0, 11.0, 12.0, 13.0, 100.0])])
+
+    assert estatisticas["n_anuncios"].iloc[0] == 4
+    assert estatisticas["preco_max"].iloc[0] == 13.0
+    assert estatisticas["mediana"].iloc[0] == 11.5
+
+
+def test_media_aparada_corta_as_pontas():
+    # 10 anúncios com corte de 10%: descarta 1 em cada ponta
+    precos = np.array([1.0, 2, 3, 4, 5, 6, 7, 8, 9, 10])
+    estatisticas = calcular_estatisticas_precos([precos], fator_iqr=100)
+
+    assert estatisticas["media_aparada"].iloc[0] == pytest.approx(np.mean(precos[1:-1]))
+
+
+def test_adicionar_preco_medio_distingue_erro_de_sem_anuncios(monkeypatch):
+    class Resposta:
+        def __init__(self, texto):
+            self.text = texto
+
+    def requisitar(url, headers):
+        if "falha" in url:
+            raise requests.ConnectionError("sem conexão")
+        if "vazio" in url:
+            return Resposta("")
+        return Resposta("<span>R$ 10,00</span><span>R$ 12,00</span>")
+
+    monkeypatch.setattr(helpers, "requisitar", requisitar)
+    df = pd.DataFrame({
+        "title": ["ok", "falha", "vazio", "manual"],
+        "year": [2020] * 4,
+        "publisher": ["p"] * 4,
+        "type": ["Collection"] * 4,
+        "preco_medio": [5.0, 33.0, 7.0, 3.0],
+        "preco_correto": ["no", "no", "no", "yes"],
+    })
+
+    resultado = adicionar_preco_medio(df, estatistica="media").set_index("title")
+
+    assert resultado.loc["ok", "preco_medio"] == 11.0
+    assert resultado.loc["falha", "preco_medio"] == 33.0
+    assert resultado.loc["falha", "falha_busca"]
+    assert np.isnan(resultado.loc["falha", "n_anuncios"])
+    assert resultado.loc["vazio", "preco_medio"] == 0
+    assert resultado.loc["vazio", "n_anuncios"] == 0
+    assert not resultado.loc["vazio", "falha_busca"]
+    assert resultado.loc["manual", "preco_medio"] == 3.0
+
+
+def test_requisitar_espera_o_maior_entre_retry_after_e_backoff(monkeypatch):
+    class Resposta:
+        def __init__(self, status, retry_after=""):
+            self.status_code = status
+            self.headers = {"Retry-After": retry_after}
+
+        def raise_for_status(self):
+            pass
+
+    respostas = iter([Resposta(429, "5"), Resposta(200)])
+    esperas = []
+    monkeypatch.setattr(helpers.requests, "get", lambda *args, **kwargs: next(respostas))
+    monkeypatch.setattr(helpers.time, "sleep", esperas.append)
+
+    helpers.requisitar("url", {}, atraso=1.0)
+
+    assert esperas == [1.0, 5, 1.0]
+
+
+def coleta(data, precos, falhas=()):
+    df = pd.DataFrame({
+        "title": list(precos),
+        "type": "Collection",
+        "preco_medio": list(precos.values()),
+        "n_anuncios": 3,
+    })
+    df["falha_busca"] = df["title"].isin(falhas)
+    df.loc[df["falha_busca"], "n_anuncios"] = np.nan
+    return gerar_coleta(df, data)
+
+
+def test_valor_total_mantem_preco_de_busca_com_erro():
+    historico = montar_historico([
+        coleta("2026-01-01T00:00:00+00:00", {"A": 10.0, "B": 20.0, "C": 30.0}),
+        coleta("2026-01-02T00:00:00+00:00", {"A": 15.0, "B": 20.0, "C": 30.0}, falhas=["B"]),
+    ])
+
+    evolucao = valor_total_por_data(historico)
+
+    assert evolucao["valor_total"].tolist() == [60.0, 65.0]
+    assert evolucao["livros"].tolist() == [3, 3]
+    assert evolucao["falhas"].tolist() == [0, 1]
+
+
+def test_maiores_variacoes_inclui_livros_novos_e_ignora_sem_preco():
+    historico = montar_historico([
+        coleta("2026-01-01T00:00:00+00:00", {"A": 10.0}),
+        coleta("2026-01-02T00:00:00+00:00", {"A": 12.0, "B": 50.0}),
+        coleta("2026-01-03T00:00:00+00:00", {"A": 0.0, "B": 40.0}, falhas=["A"]),
+    ])
+
+    variacoes = maiores_variacoes(historico).set_index("title")
+
+    assert variacoes.loc["B", "variacao"] == -10.0
+    assert variacoes.loc["A", "preco_anterior"] == 10.0
+    assert variacoes.loc["A", "preco_atual"] == 12.0
+
+
+def test_mesclar_precos_preserva_preco_correto_e_livros_novos():
+    df_com_precos = pd.DataFrame({
+        "title": ["A", "B"],
+        "type": ["Collection", "Collection"],
+        "preco_medio": [10.0, 20.0],
+    })
+    # Durante a busca, B foi marcado como preço correto e C foi adicionado
+    df_atual = pd.DataFrame({
+        "title": ["A", "B", "C"],
+        "type": ["Collection", "Collection", "Collection"],
+        "preco_medio": [1.0, 50.0, 0.0],
+        "preco_correto": ["no", "yes", "no"],
+    })
+
+    resultado = cli.mesclar_precos(df_atual, df_com_precos)
+
+    assert resultado["preco_medio"].tolist() == [10.0, 50.0, 0.0]
+    assert resultado["title"].tolist() == ["A", "B", "C"]
@@ -1,9 +1,8 @@
 import requests, base64, pandas as pd
 from io import StringIO
-import streamlit as st
 from config import CSV_PATH, REPO, GITHUB_TOKEN, TTL
 
-def carregar_csv_do_github(repo, path, token):
+def carregar_csv_do_github(repo, path, token, retornar_sha=False):
     import base64, requests, pandas as pd
     from io import StringIO
 
@@ -14,11 +13,14 @@ def carregar_csv_do_github(repo, path, token):
     if r.status_code == 200:
         conteudo_base64 = r.json()["content"]
         conteudo_csv = base64.b64decode(conteudo_base64).decode()
-        return pd.read_csv(StringIO(conteudo_csv))
+        df = pd.read_csv(StringIO(conteudo_csv))
+        # O sha permite gravar depois só se o arquivo não tiver mudado
+        return (df, r.json()["sha"]) if retornar_sha else df
     elif r.status_code == 404:
         # Arquivo não existe: retorna DataFrame vazio com colunas padrão
         colunas = ["isbn", "genre", "cover", "title", "authors", "publisher", "year", "preco_medio", "collection", "volume", "pages", "type","preco_medio"]
-        return pd.DataFrame(columns=colunas)
+        df = pd.DataFrame(columns=colunas)
+        return (df, None) if retornar_sha else df
     else:
         raise Exception(f"Erro ao carregar CSV do GitHub: {r.status_code} - {r.text}")
 
@@ -77,15 +79,16 @@ def salvar_csv_em_github(df_novo, repo, path, token):
 
 
 
-def alterar_csv_em_github(df_novo, repo, path, token):
+def alterar_csv_em_github(df_novo, repo, path, token, sha=None):
     import base64, requests
 
     url = f"https://api.github.com/repos/{repo}/contents/{path}"
     headers = {"Authorization": f"token {token}"}
 
-    # Verifica se o arquivo já existe para obter o SHA
-    r_get = requests.get(url, headers=headers)
-    sha = r_get.json()["sha"] if r_get.status_code == 200 else None
+    # Sem sha informado, usa o atual; com sha, o GitHub recusa (409) se o arquivo mudou desde a leitura
+    if sha is None:
+        r_get = requests.get(url, headers=headers)
+        sha = r_get.json()["sha"] if r_get.status_code == 200 else None
 
     # Prepara conteúdo para upload
     conteudo_csv = df_novo.to_csv(index=False)
@@ -138,3 +141,8 @@ def salvar_imagem_em_github(imagem_bytes, repo, caminho_imagem, token, mensagem_
         return True, "Imagem salva com sucesso"
     else:
         return False, f"Erro ao salvar imagem: {r_put.status_code} - {r_put.text}"
+
+
+def salvar_arquivo_em_github(conteudo, repo, path, token, mensagem_commit="Atualização de arquivo via Streamlit"):
+    # O envio de imagens já trata qualquer conteúdo binário
+    return salvar_imagem_em_github(conteudo, repo, path, token, mensagem_commit=mensagem_commit)
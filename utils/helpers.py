@@ -1,20 +1,120 @@
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
+import numpy as np
 import re
 import time
-import streamlit as st
 import matplotlib.pyplot as plt
 from matplotlib.patches import FancyBboxPatch
 import plotly.graph_objects as go
 from PIL import Image
 import os
 import unicodedata
+import itertools
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from requests.utils import quote
 
-from config import CSV_PATH, REPO, GITHUB_TOKEN, TTL
+from config import CSV_PATH, REPO, GITHUB_TOKEN, TTL, ESTATISTICA_PRECO, ESTATISTICAS_PRECO
+
+# Valor em reais no formato brasileiro: "R$ 1.234,56"
+PADRAO_PRECO = re.compile(r"R\$\s*(\d{1,3}(?:\.\d{3})*,\d{2}|\d+,\d{2})")
+# Spans de parcelamento ("3x de R$ 10,00") e frete não são preço do livro
+PADRAO_IGNORADO = re.compile(r"\d+\s*x|parcela|frete", re.IGNORECASE)
+
+# Pausa antes de cada requisição (por worker) e novas tentativas para 429/5xx
+ATRASO_REQUISICAO = 1.0
+TENTATIVAS = 3
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+
+def requisitar(url, headers, tentativas=TENTATIVAS, atraso=ATRASO_REQUISICAO):
+    for tentativa in range(tentativas):
+        time.sleep(atraso)
+        response = None
+        try:
+            response = requests.get(url, headers=headers, timeout=10)
+        except (requests.ConnectionError, requests.Timeout):
+            if tentativa == tentativas - 1:
+                raise
+        else:
+            if response.status_code not in STATUS_REPETIR or tentativa == tentativas - 1:
+                response.raise_for_status()
+                return response
+        # Espera o maior entre o backoff e o Retry-After do servidor (quando vier em segundos)
+        espera = atraso * 2 ** tentativa
+        retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+        if retry_after.isdigit():
+            espera = max(espera, int(retry_after))
+        time.sleep(espera)
+
+
+def extrair_precos(html):
+    soup = BeautifulSoup(html, "html.parser")
+    precos = []
+    for tag in soup.find_all("span", string=re.compile(r"R\$")):
+        texto = tag.get_text(" ", strip=True)
+        if PADRAO_IGNORADO.search(texto):
+            continue
+        encontrado = PADRAO_PRECO.search(texto)
+        if encontrado is None:
+            print(f"Preço não reconhecido em '{texto}'")
+            continue
+        precos.append(float(encontrado.group(1).replace(".", "").replace(",", ".")))
+    return np.array(precos, dtype=float)
+
+
+def calcular_estatisticas_precos(listas_precos, fator_iqr=1.5, proporcao_corte=0.1):
+    if len(listas_precos) == 0:
+        return pd.DataFrame(columns=["media", "mediana", "media_aparada", "preco_min", "preco_max", "n_anuncios", "falha_busca"])
+
+    # Monta uma matriz (livros x anúncios) preenchida com NaN e calcula tudo de uma vez.
+    # Buscas que falharam (None) entram como linhas vazias, mas com n_anuncios NaN em vez de 0.
+    falha_busca = np.array([precos is None for precos in listas_precos], dtype=bool)
+    tamanhos = np.array([0 if precos is None else len(precos) for precos in listas_precos], dtype=int)
+    largura = max(int(tamanhos.max(initial=0)), 1)
+    matriz = np.full((len(tamanhos), largura), np.nan)
+    ocupado = np.arange(largura) < tamanhos[:, None]
+    matriz[ocupado] = np.fromiter(itertools.chain.from_iterable(precos for precos in listas_precos if precos is not None), dtype=float, count=int(tamanhos.sum()))
+
+    with warnings.catch_warnings():
+        # Livros sem anúncios geram linhas só com NaN, que resultam em NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+
+        # Rejeição de outliers pelo intervalo interquartil
+        q1, q3 = np.nanpercentile(matriz, [25, 75], axis=1)
+        iqr = q3 - q1
+        dentro = (matriz >= (q1 - fator_iqr * iqr)[:, None]) & (matriz <= (q3 + fator_iqr * iqr)[:, None])
+        filtrada = np.where(dentro, matriz, np.nan)
+
+        contagem = dentro.sum(axis=1)
+        media = np.nanmean(filtrada, axis=1)
+        mediana = np.nanmedian(filtrada, axis=1)
+        preco_min = np.nanmin(filtrada, axis=1)
+        preco_max = np.nanmax(filtrada, axis=1)
+
+        # Média aparada: descarta a mesma quantidade de anúncios em cada ponta
+        ordenada = np.sort(filtrada, axis=1)
+        corte = np.floor(contagem * proporcao_corte).astype(int)
+        posicoes = np.arange(largura)
+        mantidos = (posicoes >= corte[:, None]) & (posicoes < (contagem - corte)[:, None])
+        media_aparada = np.where(mantidos, ordenada, 0.0).sum(axis=1) / mantidos.sum(axis=1)
+
+    return pd.DataFrame({
+        "media": media,
+        "mediana": mediana,
+        "media_aparada": media_aparada,
+        "preco_min": preco_min,
+        "preco_max": preco_max,
+        "n_anuncios": np.where(falha_busca, np.nan, contagem),
+        "falha_busca": falha_busca,
+    })
+
+
+def adicionar_preco_medio(df, nova_coluna="preco_medio", estatistica=ESTATISTICA_PRECO, workers=1):
+    if estatistica not in ESTATISTICAS_PRECO:
+        raise ValueError(f"Estatística '{estatistica}' inválida. Use uma de: {', '.join(ESTATISTICAS_PRECO)}")
 
-def adicionar_preco_medio(df, nova_coluna="preco_medio"):
     def buscar_preco(title, year, publisher):
         # Garantir que os valores são strings
         titulo_formatado = quote(str(title).lower())
@@ -30,66 +130,63 @@ def adicionar_preco_medio(df, nova_coluna="preco_medio"):
         )
         headers = {"User-Agent": "Mozilla/5.0"}
         try:
-            response2 = requests.get(url2, headers=headers, timeout=10)
-            response2.raise_for_status()
+            response2 = requisitar(url2, headers)
         except Exception as e:
             print(f"Erro ao buscar '{title}': {e}")
             return None
         try:
-            response3 = requests.get(url3, headers=headers, timeout=10)
-            response3.raise_for_status()
+            response3 = requisitar(url3, headers)
         except Exception as e:
             print(f"Erro ao buscar '{title}': {e}")
             return None
 
-        soup2 = BeautifulSoup(response2.text, "html.parser")
-        precos2 = []
-        for tag2 in soup2.find_all("span", string=re.compile(r"R\$")):
-            texto2 = tag2.get_text(strip=True)
-            valor2 = re.sub(r"[^\d,]", "", texto2)
-            try:
-                valor_float2 = float(valor2.replace(",", "."))
-                precos2.append(valor_float2)
-            except ValueError as ve2:
-                print(f"Erro ao converter '{valor2}' para float: {ve2}")
-                continue
-        soup3 = BeautifulSoup(response3.text, "html.parser")
-        precos3 = []
-        for tag3 in soup3.find_all("span", string=re.compile(r"R\$")):
-            texto3 = tag3.get_text(strip=True)
-            valor3 = re.sub(r"[^\d,]", "", texto3)
-            try:
-                valor_float3 = float(valor3.replace(",", "."))
-                precos3.append(valor_float3)
-            except ValueError as ve3:
-                print(f"Erro ao converter '{valor3}' para float: {ve3}")
-                continue
-
-        if precos2:
-            media = round(sum(precos2) / len(precos2), 2)
-            print(f"Preço médio para '{title}': R$ {media}")
-            return media
+        precos2 = extrair_precos(response2.text)
+        precos3 = extrair_precos(response3.text)
+
+        if precos2.size:
+            print(f"{precos2.size} preços encontrados para '{title}'")
+            return precos2
         else:
-            if precos3:
-                media = round(sum(precos3) / len(precos3), 2)
-                print(f"Preço médio para '{title}': R$ {media}")
-                return media
+            if precos3.size:
+                print(f"{precos3.size} preços encontrados para '{title}'")
+                return precos3
             else:
                 print(f"Nenhum preço encontrado para '{title}'")
-                return 0
+                return np.array([], dtype=float)
     df1 = df[df['preco_correto'] == 'yes']
-    df2 = df[df['preco_correto'] != 'yes']
+    df2 = df[df['preco_correto'] != 'yes'].copy()
 
-    df2[nova_coluna] = df2.apply(
-        lambda row: buscar_preco(row["title"], row["year"], row["publisher"]),
-        axis=1
-    )
+    # Coleta os anúncios de todos os livros ('workers' buscas simultâneas, na ordem de df2)
+    # e depois calcula as estatísticas num único passo
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        listas_precos = list(executor.map(
+            lambda row: buscar_preco(row.title, row.year, row.publisher),
+            df2.itertuples()
+        ))
+    estatisticas = calcular_estatisticas_precos(listas_precos)
+    estatisticas.index = df2.index
+    falhou = estatisticas["falha_busca"].astype(bool)
+
+    # Sem anúncios o preço vira 0; se a busca falhou, mantém o preço anterior do livro
+    preco_anterior = pd.to_numeric(df2[nova_coluna], errors="coerce") if nova_coluna in df2.columns else np.nan
+    df2[nova_coluna] = estatisticas[estatistica].round(2).fillna(0).where(~falhou, preco_anterior)
+    df2["preco_min"] = estatisticas["preco_min"]
+    df2["preco_mediana"] = estatisticas["mediana"]
+    df2["preco_max"] = estatisticas["preco_max"]
+    df2["n_anuncios"] = estatisticas["n_anuncios"]
+    df2["falha_busca"] = falhou
+
+    sem_anuncios = (~falhou & (estatisticas["n_anuncios"] == 0)).sum()
+    print(f"{len(df2)} livros buscados: {falhou.sum()} com erro na busca (preço anterior mantido), {sem_anuncios} sem anúncios")
 
     df = pd.concat([df1, df2], ignore_index=True).drop_duplicates()
+    df["falha_busca"] = df["falha_busca"].astype("boolean").fillna(False).astype(bool)
 
     return df
 
 def autenticar():
+    import streamlit as st
+
     senha_correta = st.secrets["senha_app"]
     senha_digitada = st.text_input("Enter the password to edit the collection", type="password")
     if senha_digitada == senha_correta:
@@ -0,0 +1,144 @@
+import glob
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+import pandas as pd
+
+COLUNAS_ESTATISTICAS = ["preco_min", "preco_mediana", "preco_max", "n_anuncios"]
+COLUNAS_COLETA = ["data", "title", "type", "preco_medio"] + COLUNAS_ESTATISTICAS + ["falha_busca"]
+
+# Cada atualização grava um CSV pequeno em historico/ e nada do que já foi gravado é alterado.
+# Para consultar, os arquivos são carregados num SQLite em memória: livros e coletas ficam em
+# tabelas próprias e os preços são indexados por (livro_id, coleta_id).
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS livros (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    type TEXT NOT NULL,
+    UNIQUE (title, type)
+);
+CREATE TABLE IF NOT EXISTS coletas (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS precos (
+    livro_id INTEGER NOT NULL REFERENCES livros (id),
+    coleta_id INTEGER NOT NULL REFERENCES coletas (id),
+    preco_medio REAL,
+    preco_min REAL,
+    preco_mediana REAL,
+    preco_max REAL,
+    n_anuncios INTEGER,
+    falha_busca INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (livro_id, coleta_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_precos_coleta ON precos (coleta_id, livro_id);
+"""
+
+
+def gerar_coleta(df, data=None, nova_coluna="preco_medio"):
+    if data is None:
+        data = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    coleta = pd.DataFrame({
+        "data": data,
+        "title": df["title"].astype(str),
+        "type": df["type"].astype(str),
+        "preco_medio": pd.to_numeric(df[nova_coluna], errors="coerce"),
+    })
+    for coluna in COLUNAS_ESTATISTICAS:
+        coleta[coluna] = df[coluna] if coluna in df.columns else None
+    coleta["falha_busca"] = df["falha_busca"].fillna(False).astype(bool) if "falha_busca" in df.columns else False
+
+    # Sem anúncios ou com erro na busca não há preço observado: fica vazio e as consultas usam o último conhecido
+    sem_preco = (pd.to_numeric(coleta["n_anuncios"], errors="coerce") == 0) | coleta["falha_busca"]
+    coleta["preco_medio"] = coleta["preco_medio"].where(~sem_preco)
+    return coleta.drop_duplicates(subset=["title", "type"], keep="last").loc[:, COLUNAS_COLETA]
+
+
+def caminho_coleta(pasta, data):
+    # ':' não é aceito em nomes de arquivo em todos os sistemas
+    return f"{pasta}/{data.replace(':', '-')}.csv"
+
+
+def listar_coletas(pasta):
+    return sorted(glob.glob(os.path.join(pasta, "*.csv")))
+
+
+def montar_historico(coletas):
+    # Recebe os DataFrames das coletas e devolve uma conexão SQLite em memória com os índices
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.executescript(ESQUEMA)
+
+    coletas = [coleta for coleta in coletas if len(coleta)]
+    if not coletas:
+        return conn
+
+    registros = pd.concat(coletas, ignore_index=True)
+    registros["title"] = registros["title"].astype(str)
+    registros["type"] = registros["type"].astype(str)
+    registros = registros.drop_duplicates(subset=["data", "title", "type"], keep="last")
+
+    # Ids de coleta seguem a ordem cronológica; as consultas dependem disso
+    livros = registros[["title", "type"]].drop_duplicates().reset_index(drop=True)
+    livros["livro_id"] = livros.index + 1
+    datas = pd.DataFrame({"data": sorted(registros["data"].unique())})
+    datas["coleta_id"] = datas.index + 1
+
+    registros = registros.merge(livros, on=["title", "type"]).merge(datas, on="data")
+    registros["falha_busca"] = registros["falha_busca"].astype(str).str.lower().isin(["true", "1"]).astype(int)
+
+    with conn:
+        livros.rename(columns={"livro_id": "id"}).to_sql("livros", conn, if_exists="append", index=False)
+        datas.rename(columns={"coleta_id": "id"}).to_sql("coletas", conn, if_exists="append", index=False)
+        registros[["livro_id", "coleta_id", "preco_medio"] + COLUNAS_ESTATISTICAS + ["falha_busca"]].to_sql(
+            "precos", conn, if_exists="append", index=False
+        )
+    return conn
+
+
+def valor_total_por_data(conn, tipo=None):
+    # Soma, em cada coleta, o último preço conhecido de cada livro presente nela.
+    # Um livro sem preço naquela coleta (erro na busca, sem anúncios) entra com o preço anterior.
+    consulta = """
+        SELECT c.data,
+            SUM((SELECT ant.preco_medio FROM precos ant
+                 WHERE ant.livro_id = p.livro_id AND ant.coleta_id <= c.id AND ant.preco_medio IS NOT NULL
+                 ORDER BY ant.coleta_id DESC LIMIT 1)) AS valor_total,
+            COUNT(*) AS livros,
+            SUM(p.falha_busca) AS falhas
+        FROM coletas c
+        JOIN precos p ON p.coleta_id = c.id
+        JOIN livros l ON l.id = p.livro_id
+        WHERE (? IS NULL OR l.type = ?)
+        GROUP BY c.id
+        ORDER BY c.id
+    """
+    df = pd.read_sql_query(consulta, conn, params=(tipo, tipo))
+    df["data"] = pd.to_datetime(df["data"])
+    return df
+
+
+def maiores_variacoes(conn, n=10, tipo=None):
+    # Compara, para cada livro da última coleta, o primeiro e o último preço registrados.
+    # As subconsultas por livro usam a chave primária (livro_id, coleta_id).
+    consulta = """
+        SELECT l.title, l.type,
+            (SELECT p.preco_medio FROM precos p
+             WHERE p.livro_id = l.id AND p.preco_medio IS NOT NULL
+             ORDER BY p.coleta_id ASC LIMIT 1) AS preco_anterior,
+            (SELECT p.preco_medio FROM precos p
+             WHERE p.livro_id = l.id AND p.preco_medio IS NOT NULL
+             ORDER BY p.coleta_id DESC LIMIT 1) AS preco_atual
+        FROM livros l
+        WHERE l.id IN (SELECT livro_id FROM precos WHERE coleta_id = (SELECT MAX(id) FROM coletas))
+          AND (? IS NULL OR l.type = ?)
+    """
+    tabela = pd.read_sql_query(consulta, conn, params=(tipo, tipo))
+
+    tabela = tabela.dropna(subset=["preco_anterior", "preco_atual"])
+    tabela["variacao"] = tabela["preco_atual"] - tabela["preco_anterior"]
+    tabela["variacao_pct"] = (tabela["variacao"] / tabela["preco_anterior"].where(tabela["preco_anterior"] != 0)) * 100
+    tabela = tabela.reindex(tabela["variacao"].abs().sort_values(ascending=False).index)
+    return tabela.head(n).reset_index(drop=True)